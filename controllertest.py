@@ -1,9 +1,16 @@
 """Xbox controller input counter and visualizer using tkinter."""
 
+import array
+import collections
+import ctypes
+import glob
+import os
+import selectors
+import struct
+import sys
 import tkinter as tk
-from datetime import datetime
 from inputs import get_gamepad
-from time import time
+from time import localtime, monotonic, perf_counter, strftime, time
 import threading
 import math
 
@@ -16,6 +23,52 @@ class ControllerCounter:
     Includes analog stick position tracking and debugging information.
     """
 
+    # Label fonts, shared by every widget that uses them
+    FONT_LABEL = ('Arial', 12)
+    FONT_DEBUG = ('Arial', 10)
+
+    # Stick directions by octant, counter-clockwise from East
+    DIRECTIONS = (
+        "East", "Northeast", "North", "Northwest",
+        "West", "Southwest", "South", "Southeast"
+    )
+
+    # Kinds of items queued by the reader thread, indexing _kind_handlers
+    KIND_INPUT = 0
+    KIND_ERROR = 1
+
+    # Stick names by stick index (analog_states slot // 2)
+    STICK_NAMES = ('LEFT', 'RIGHT')
+
+    # Linux evdev device nodes, event layout and the codes we handle,
+    # named the same way the inputs library reports them
+    EVDEV_DEVICE_GLOB = '/dev/input/by-id/*-event-joystick'
+    EVDEV_EVENT = struct.Struct('llHHi')  # struct input_event
+    EVDEV_READ_EVENTS = 64  # Events fetched per read() call
+    EVDEV_CODES = {
+        (0x01, 0x130): 'BTN_SOUTH',
+        (0x01, 0x131): 'BTN_EAST',
+        (0x01, 0x133): 'BTN_NORTH',
+        (0x01, 0x134): 'BTN_WEST',
+        (0x01, 0x136): 'BTN_TL',
+        (0x01, 0x137): 'BTN_TR',
+        (0x03, 0x00): 'ABS_X',
+        (0x03, 0x01): 'ABS_Y',
+        (0x03, 0x02): 'ABS_Z',
+        (0x03, 0x03): 'ABS_RX',
+        (0x03, 0x04): 'ABS_RY',
+        (0x03, 0x05): 'ABS_RZ',
+        (0x03, 0x10): 'ABS_HAT0X',
+        (0x03, 0x11): 'ABS_HAT0Y',
+    }
+
+    # Squared stick distance is bucketed by this shift for the magnitude table
+    MAGNITUDE_SHIFT = 16
+
+    # tan(22.5 degrees) as a close fraction, for integer octant boundaries
+    TAN_22_5_NUM = 5741
+    TAN_22_5_DEN = 13860
+
     def __init__(self):
         """Initialize the controller counter and setup the GUI."""
         self.window = tk.Tk()
@@ -31,10 +84,11 @@ class ControllerCounter:
         )
         current_frame.pack(fill="x", padx=10, pady=5)
         
+        self.current_input_var = tk.StringVar(self.window, value="No input")
         self.current_input_label = tk.Label(
             current_frame,
-            text="No input",
-            font=('Arial', 12)
+            textvariable=self.current_input_var,
+            font=self.FONT_LABEL
         )
         self.current_input_label.pack(pady=5)
 
@@ -48,18 +102,26 @@ class ControllerCounter:
         analog_frame.pack(fill="x", padx=10, pady=5)
 
         # Left stick status
+        self.left_stick_var = tk.StringVar(
+            self.window,
+            value="Left Stick: Center"
+        )
         self.left_stick_label = tk.Label(
             analog_frame,
-            text="Left Stick: Center",
-            font=('Arial', 12)
+            textvariable=self.left_stick_var,
+            font=self.FONT_LABEL
         )
         self.left_stick_label.pack(pady=5)
 
         # Right stick status
+        self.right_stick_var = tk.StringVar(
+            self.window,
+            value="Right Stick: Center"
+        )
         self.right_stick_label = tk.Label(
             analog_frame,
-            text="Right Stick: Center",
-            font=('Arial', 12)
+            textvariable=self.right_stick_var,
+            font=self.FONT_LABEL
         )
         self.right_stick_label.pack(pady=5)
 
@@ -72,10 +134,14 @@ class ControllerCounter:
         )
         debug_frame.pack(fill="x", padx=10, pady=5)
 
+        self.debug_var = tk.StringVar(
+            self.window,
+            value="Raw Input Values:\nNo input received"
+        )
         self.debug_label = tk.Label(
             debug_frame,
-            text="Raw Input Values:\nNo input received",
-            font=('Arial', 10),
+            textvariable=self.debug_var,
+            font=self.FONT_DEBUG,
             justify=tk.LEFT
         )
         self.debug_label.pack(pady=5)
@@ -89,17 +155,25 @@ class ControllerCounter:
         )
         counter_frame.pack(fill="x", padx=10, pady=5)
         
+        self.counter_var = tk.StringVar(
+            self.window,
+            value="Current count (1s): 0"
+        )
         self.counter_label = tk.Label(
             counter_frame,
-            text="Current count (1s): 0",
-            font=('Arial', 12)
+            textvariable=self.counter_var,
+            font=self.FONT_LABEL
         )
         self.counter_label.pack(pady=5)
         
+        self.last_count_var = tk.StringVar(
+            self.window,
+            value="Previous count: 0"
+        )
         self.last_count_label = tk.Label(
             counter_frame,
-            text="Previous count: 0",
-            font=('Arial', 12)
+            textvariable=self.last_count_var,
+            font=self.FONT_LABEL
         )
         self.last_count_label.pack(pady=5)
         
@@ -112,8 +186,18 @@ class ControllerCounter:
         )
         history_frame.pack(fill="both", expand=True, padx=10, pady=5)
         
-        # Create text widget for history
-        self.history_text = tk.Text(history_frame, height=15, width=50)
+        # Create text widget for history; it is an append-only log, so no
+        # undo stack or line wrapping, and read-only between flushes
+        self.history_text = tk.Text(
+            history_frame,
+            height=15,
+            width=50,
+            undo=False,
+            maxundo=0,
+            autoseparators=False,
+            wrap=tk.NONE,
+            state=tk.DISABLED
+        )
         self.history_text.pack(fill="both", expand=True)
         
         # Scrollbar for history
@@ -121,9 +205,20 @@ class ControllerCounter:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.history_text.config(yscrollcommand=scrollbar.set)
         
+        # History lines waiting to be written on the next drain; while the
+        # window is minimized only the newest max_history_lines are kept
+        self.max_history_lines = 2000  # Oldest lines are dropped past this
+        self._hist_buf = collections.deque(maxlen=self.max_history_lines)
+        self._hist_lines = 0  # Lines currently in the text widget
+        
+        # Skip history writes while the window isn't mapped
+        self._history_visible = True
+        self.window.bind('<Map>', self._on_map)
+        self.window.bind('<Unmap>', self._on_unmap)
+        
         # Initialize counters and timing
         self.press_count = 0
-        self.last_reset = time()
+        self._last_second = int(monotonic())  # current one-second bucket
         self.last_count = 0
         
         # Button mapping for clearer names
@@ -133,92 +228,165 @@ class ControllerCounter:
             'BTN_EAST': 'B Button',
             'BTN_WEST': 'X Button',
             'BTN_TR': 'R1',
-            'BTN_TL': 'L1',
+            'BTN_TL': 'L1'
+        }
+        
+        # Analog triggers, reported as Absolute events
+        self.trigger_names = {
             'ABS_RZ': 'R2',
-            'ABS_Z': 'L2',
+            'ABS_Z': 'L2'
+        }
+        
+        # D-pad hat axes, named by hat value
+        self.dpad_names = {
             'ABS_HAT0Y': {-1: 'D-Pad Up', 1: 'D-Pad Down'},
             'ABS_HAT0X': {-1: 'D-Pad Left', 1: 'D-Pad Right'}
         }
 
-        # Analog stick states
-        self.analog_states = {
-            'LEFT': {'X': 0, 'Y': 0},
-            'RIGHT': {'X': 0, 'Y': 0}
-        }
+        # Analog stick states: left X, left Y, right X, right Y
+        self.analog_states = array.array('i', [0, 0, 0, 0])
         
-        # Analog stick mapping
+        # Analog stick mapping to analog_states slots
         self.analog_mapping = {
-            'ABS_X': ('LEFT', 'X'),
-            'ABS_Y': ('LEFT', 'Y'),
-            'ABS_RX': ('RIGHT', 'X'),
-            'ABS_RY': ('RIGHT', 'Y')
+            'ABS_X': 0,
+            'ABS_Y': 1,
+            'ABS_RX': 2,
+            'ABS_RY': 3
         }
 
+        # Latest stick position waiting to be displayed on the next drain
+        self._pending_stick = {'LEFT': None, 'RIGHT': None}
+        
+        # Stick position last rendered, to skip identical redraws
+        self._last_stick_state = {'LEFT': (0, 0), 'RIGHT': (0, 0)}
+        
+        # Last direction logged to history for each stick
+        self._stick_directions = {'LEFT': 'Center', 'RIGHT': 'Center'}
+
         # Analog stick thresholds and calibration
         self.analog_threshold = 3000  # Minimum movement to register
+        self.analog_jitter = 256  # Smaller axis changes are dropped
         self.analog_max = 32768  # Maximum analog value
         self.analog_deadzone = 0.1  # 10% deadzone
+        self._deadzone_sq = math.ceil((self.analog_deadzone * self.analog_max) ** 2)
+        
+        # Magnitude percentage (capped at 100) per squared-distance bucket
+        bucket = 1 << self.MAGNITUDE_SHIFT
+        self._magnitude_lut = bytes(
+            min(100, round(100 * math.sqrt((i + 0.5) * bucket) / self.analog_max))
+            for i in range((2 * self.analog_max ** 2) // bucket + 1)
+        )
         
         # Button state tracking
         self.button_states = {}
         
-        # Trigger thresholds
-        self.trigger_threshold = 100  # Adjust based on controller
+        # Trigger thresholds, with a hysteresis band to ignore noise
+        self.trigger_press_threshold = 120  # Adjust based on controller
+        self.trigger_release_threshold = 80
+        
+        # D-pad direction for each (code, state) pair
+        self._dpad_lookup = {
+            (code, state): direction
+            for code, directions in self.dpad_names.items()
+            for state, direction in directions.items()
+        }
+        
+        # Handler for each known event code
+        self._handlers = {}
+        for code in self.button_names:
+            self._handlers[code] = self._handle_button
+        for code in self.trigger_names:
+            self._handlers[code] = self._handle_trigger
+        for code in self.dpad_names:
+            self._handlers[code] = self._handle_dpad
+        for code in self.analog_mapping:
+            self._handlers[code] = self._handle_analog
+        
+        # Debug information, pre-seeded with every known code so the key set
+        # and display order stay stable; redrawn on the next drain when dirty
+        self.debug_info = dict.fromkeys(self._handlers, 0)
+        self._debug_lines = {code: f"{code}: 0" for code in self.debug_info}
+        self._debug_dirty = False
+        
+        # Items handed from the reader thread to the GUI thread, as tuples
+        # tagged with a KIND_* value in their first slot. Bounded so a
+        # stalled GUI drops the oldest input instead of growing forever.
+        self._events = collections.deque(maxlen=4096)
+        self._kind_handlers = (self._dispatch, self._show_error)
         
-        # Debug information
-        self.debug_info = {}
+        # Events are stamped with perf_counter(); this pair maps those
+        # monotonic stamps back to wall-clock time for display
+        self._start_wall = time()
+        self._start_perf = perf_counter()
         
-        # Flag for thread control
+        # "HH:MM:SS" of the second last formatted, reused within that second
+        self._ts_second = None
+        self._ts_prefix = ""
+        
+        # Text last set on each label, to skip no-op reconfigures
+        self._label_texts = {}
+        
+        # Flag for thread control, and an event that cuts the reader's
+        # reconnect wait short on shutdown
         self.running = True
+        self._wake = threading.Event()
         
         # Start controller input thread
         self.controller_thread = threading.Thread(target=self.read_controller)
         self.controller_thread.daemon = True
         self.controller_thread.start()
+        
+        # Start draining queued events on the GUI thread, aiming for one
+        # drain per drain_interval ms however long each drain takes
+        self.drain_interval = 16
+        self.window.after(self.drain_interval, self._drain)
 
     def get_analog_direction(self, x, y):
         """Convert analog stick coordinates to direction and magnitude."""
-        # Normalize values to -1 to 1 range
-        x_norm = x / self.analog_max
-        y_norm = -y / self.analog_max  # Invert Y axis to match standard coordinates
-
-        # Calculate magnitude (distance from center)
-        magnitude = math.sqrt(x_norm**2 + y_norm**2)
+        y = -y  # Invert Y axis to match standard coordinates
+        dist_sq = x * x + y * y
         
         # Apply deadzone
-        if magnitude < self.analog_deadzone:
+        if dist_sq < self._deadzone_sq:
             return "Center", 0
 
-        # Calculate angle in degrees
-        angle = math.degrees(math.atan2(y_norm, x_norm))
-        if angle < 0:
-            angle += 360
-
-        # Convert angle to cardinal direction
-        directions = [
-            "East", "Northeast", "North", "Northwest",
-            "West", "Southwest", "South", "Southeast"
-        ]
-        index = int((angle + 22.5) / 45) % 8
-        direction = directions[index]
+        # Pick the octant with integer comparisons against tan(22.5)
+        ax = abs(x)
+        ay = abs(y)
+        if ay * self.TAN_22_5_DEN < ax * self.TAN_22_5_NUM:
+            index = 0 if x > 0 else 4
+        elif ax * self.TAN_22_5_DEN <= ay * self.TAN_22_5_NUM:
+            index = 2 if y > 0 else 6
+        elif y > 0:
+            index = 1 if x > 0 else 3
+        else:
+            index = 7 if x > 0 else 5
 
-        # Return direction and magnitude as percentage
-        return direction, round(magnitude * 100)
+        # Return direction and magnitude as percentage; devices reporting
+        # past analog_max land in the last (100%) bucket
+        lut = self._magnitude_lut
+        magnitude = lut[min(dist_sq >> self.MAGNITUDE_SHIFT, len(lut) - 1)]
+        return self.DIRECTIONS[index], magnitude
 
     def update_analog_display(self, stick, x, y):
         """Update the display for analog stick position."""
         direction, magnitude = self.get_analog_direction(x, y)
         
         if stick == 'LEFT':
-            self.left_stick_label.config(
-                text=f"Left Stick: {direction} ({magnitude}%)"
+            self._set_text(
+                self.left_stick_var,
+                f"Left Stick: {direction} ({magnitude}%)"
             )
         else:
-            self.right_stick_label.config(
-                text=f"Right Stick: {direction} ({magnitude}%)"
+            self._set_text(
+                self.right_stick_var,
+                f"Right Stick: {direction} ({magnitude}%)"
             )
 
-        # Log significant movements
+        # Log significant movements when the direction changes
+        if direction == self._stick_directions[stick]:
+            return
+        self._stick_directions[stick] = direction
         if magnitude > 0:
             self.add_to_history(
                 f"{stick.title()} Stick",
@@ -227,141 +395,356 @@ class ControllerCounter:
                 f"{direction} ({magnitude}%)"
             )
 
+    def _set_text(self, var, text):
+        """Set a label's text variable, skipping the Tk call if unchanged."""
+        # Variables are unhashable, so the cache is keyed by their Tcl name
+        name = str(var)
+        if self._label_texts.get(name) != text:
+            self._label_texts[name] = text
+            var.set(text)
+
     def add_to_history(self, input_name, state, timestamp=None, extra_info=None):
         """Add an input event to the history display."""
         if timestamp is None:
-            timestamp = datetime.now()
+            timestamp = perf_counter()
         
-        timestamp_str = timestamp.strftime("%H:%M:%S.%f")[:-3]
+        # Buffer the raw entry; it is only formatted if it gets written
+        self._hist_buf.append((timestamp, input_name, state, extra_info))
+
+    def _format_history_entry(self, timestamp, input_name, state, extra_info):
+        """Format one buffered history entry as a line of text."""
+        wall = self._start_wall + (timestamp - self._start_perf)
+        second = int(wall)
+        if second != self._ts_second:
+            self._ts_second = second
+            self._ts_prefix = strftime("%H:%M:%S", localtime(second))
+        ms = int((wall - second) * 1000)
+        timestamp_str = f"{self._ts_prefix}.{ms:03d}"
         if extra_info:
-            history_entry = f"[{timestamp_str}] {input_name}: {extra_info}\n"
-        else:
-            state_str = "pressed" if state else "released"
-            history_entry = f"[{timestamp_str}] {input_name} {state_str}\n"
+            return f"[{timestamp_str}] {input_name}: {extra_info}\n"
+        state_str = "pressed" if state else "released"
+        return f"[{timestamp_str}] {input_name} {state_str}\n"
+
+    def flush_history(self):
+        """Write buffered history entries to the display and auto-scroll."""
+        # Only follow new entries if the user hasn't scrolled up to read
+        at_bottom = self.history_text.yview()[1] >= 0.999
+        
+        self.history_text.config(state=tk.NORMAL)
+        format_entry = self._format_history_entry
+        self.history_text.insert(
+            tk.END,
+            "".join([format_entry(*entry) for entry in self._hist_buf])
+        )
+        
+        # Drop the oldest lines so the widget never grows unbounded; every
+        # entry is exactly one line, so the count is tracked here
+        self._hist_lines += len(self._hist_buf)
+        self._hist_buf.clear()
+        excess = self._hist_lines - self.max_history_lines
+        if excess > 0:
+            self.history_text.delete("1.0", f"{excess + 1}.0")
+            self._hist_lines = self.max_history_lines
+        self.history_text.config(state=tk.DISABLED)
         
-        # Add to text widget and auto-scroll
-        self.history_text.insert(tk.END, history_entry)
-        self.history_text.see(tk.END)
+        if at_bottom:
+            self.history_text.see(tk.END)
+
+    def update_debug_info(self, code, state):
+        """Record a raw input value for the debug display."""
+        # Repeated values (common while a stick is held) change nothing
+        if self.debug_info.get(code) == state:
+            return
+        self.debug_info[code] = state
+        self._debug_lines[code] = f"{code}: {state}"
+        self._debug_dirty = True
 
-    def update_debug_info(self, event):
-        """Update debug information display."""
-        self.debug_info[event.code] = event.state
-        debug_text = "Raw Input Values:\n"
-        for code, value in self.debug_info.items():
-            debug_text += f"{code}: {value}\n"
-        self.debug_label.config(text=debug_text)
+    def render_debug_info(self):
+        """Redraw the debug information display."""
+        debug_text = "Raw Input Values:\n" + "\n".join(
+            self._debug_lines.values()
+        )
+        self._set_text(self.debug_var, debug_text)
+        self._debug_dirty = False
 
     def update_counter(self):
-        """Update the input counter and handle one-second resets."""
-        current_time = time()
+        """Refresh the input counter labels and handle one-second resets."""
+        # Whole monotonic seconds, so clock adjustments can't skew a bucket
+        current_second = int(monotonic())
         
-        # If more than a second has passed
-        if current_time - self.last_reset >= 1:
+        # If we've moved into a new second
+        if current_second != self._last_second:
             # Store the last count before resetting
             self.last_count = self.press_count
-            self.last_count_label.config(
-                text=f"Previous count: {self.last_count}"
+            self._set_text(
+                self.last_count_var,
+                f"Previous count: {self.last_count}"
             )
             
             # Reset counter
             self.press_count = 0
-            self.last_reset = current_time
+            self._last_second = current_second
         
-        self.press_count += 1
-        self.counter_label.config(
-            text=f"Current count (1s): {self.press_count}"
+        self._set_text(
+            self.counter_var,
+            f"Current count (1s): {self.press_count}"
         )
 
     def read_controller(self):
-        """Read and process controller inputs in a separate thread."""
+        """Read controller inputs in a separate thread and queue them."""
+        self._raise_thread_priority()
+        
+        # Prefer reading the evdev device directly on Linux; once one has
+        # been found, keep waiting for it (or another) to be plugged back in
+        found = False
+        retry_delay = 0.1
+        while self.running:
+            fd = self._open_evdev_gamepad()
+            if fd is None:
+                if not found:
+                    break
+                # Back off while unplugged, up to one second between tries
+                self._wake.wait(retry_delay)
+                retry_delay = min(retry_delay * 2, 1.0)
+                continue
+            found = True
+            retry_delay = 0.1
+            self._read_evdev(fd)
+        
+        if not found:
+            self._read_gamepad()
+
+    def _raise_thread_priority(self):
+        """Ask the OS to favour the calling thread, where permitted."""
+        try:
+            if sys.platform == 'win32':
+                kernel32 = ctypes.windll.kernel32
+                THREAD_PRIORITY_ABOVE_NORMAL = 1
+                kernel32.SetThreadPriority(
+                    kernel32.GetCurrentThread(),
+                    THREAD_PRIORITY_ABOVE_NORMAL
+                )
+            elif sys.platform.startswith('linux'):
+                # Linux applies nice values to the calling thread only
+                os.nice(-5)
+        except OSError:
+            pass  # Unprivileged; keep the default priority
+
+    def _open_evdev_gamepad(self):
+        """Open the first readable evdev joystick, or return None."""
+        if not sys.platform.startswith('linux'):
+            return None
+        for path in sorted(glob.glob(self.EVDEV_DEVICE_GLOB)):
+            try:
+                return os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError:
+                continue
+        return None
+
+    def _input_enqueuer(self):
+        """Return a function that queues input events, dropping stick jitter."""
+        append = self._events.append
+        KIND_INPUT = self.KIND_INPUT
+        threshold = self.analog_threshold
+        jitter = self.analog_jitter
+        last_axis = dict.fromkeys(self.analog_mapping, 0)
+        
+        def enqueue_input(code, state, timestamp):
+            prev = last_axis.get(code)
+            if prev is not None:
+                # Skip tiny axis moves unless they cross the threshold
+                if (abs(state - prev) < jitter and
+                        (abs(prev) > threshold) == (abs(state) > threshold)):
+                    return
+                last_axis[code] = state
+            append((KIND_INPUT, code, state, timestamp))
+        
+        return enqueue_input
+
+    def _read_evdev(self, fd):
+        """Queue events from an evdev device until it fails or we stop."""
+        enqueue_input = self._input_enqueuer()
+        codes = self.EVDEV_CODES
+        iter_unpack = self.EVDEV_EVENT.iter_unpack
+        read_size = self.EVDEV_EVENT.size * self.EVDEV_READ_EVENTS
+        
+        selector = selectors.DefaultSelector()
+        selector.register(fd, selectors.EVENT_READ)
+        try:
+            while self.running:
+                # Time out regularly so shutdown is noticed promptly
+                if not selector.select(timeout=0.1):
+                    continue
+                try:
+                    data = os.read(fd, read_size)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    # Device unplugged
+                    self._events.append((self.KIND_ERROR, str(e)))
+                    return
+                
+                # Events from one read arrived together; stamp them once
+                current_time = perf_counter()
+                for _, _, ev_type, code, value in iter_unpack(data):
+                    name = codes.get((ev_type, code))
+                    if name is not None:
+                        enqueue_input(name, value, current_time)
+        finally:
+            selector.close()
+            os.close(fd)
+
+    def _read_gamepad(self):
+        """Queue events from the inputs library until we stop."""
+        enqueue_input = self._input_enqueuer()
+        errored = False
         while self.running:
             try:
                 events = get_gamepad()
+                errored = False
+                # Events from one read arrived together; stamp them once
+                current_time = perf_counter()
                 for event in events:
-                    current_time = datetime.now()
-                    
-                    # Update debug information
-                    self.window.after(
-                        0,
-                        lambda e=event: self.update_debug_info(e)
-                    )
-                    
-                    # Handle regular buttons
-                    if event.ev_type == 'Key':
-                        if event.code in self.button_names:
-                            button_name = self.button_names[event.code]
-                            self.window.after(
-                                0,
-                                lambda b=button_name, s=event.state, t=current_time:
-                                self.handle_input(b, bool(s), t)
-                            )
-                    
-                    # Handle analog inputs
-                    elif event.ev_type == 'Absolute':
-                        if event.code in self.analog_mapping:
-                            stick, axis = self.analog_mapping[event.code]
-                            self.analog_states[stick][axis] = event.state
-                            
-                            # Update analog display
-                            x = self.analog_states[stick]['X']
-                            y = self.analog_states[stick]['Y']
-                            if abs(x) > self.analog_threshold or abs(y) > self.analog_threshold:
-                                self.window.after(
-                                    0,
-                                    lambda s=stick, x=x, y=y:
-                                    self.update_analog_display(s, x, y)
-                                )
-                        
-                        # Handle triggers (R2/L2)
-                        elif event.code in ['ABS_RZ', 'ABS_Z']:
-                            button_name = self.button_names[event.code]
-                            is_pressed = event.state > self.trigger_threshold
-                            
-                            # Only register state change if crosses threshold
-                            current_state = self.button_states.get(
-                                button_name,
-                                False
-                            )
-                            if current_state != is_pressed:
-                                self.button_states[button_name] = is_pressed
-                                self.window.after(
-                                    0,
-                                    lambda b=button_name, s=is_pressed,
-                                    t=current_time: self.handle_input(b, s, t)
-                                )
-                        
-                        # Handle D-pad
-                        elif (event.code in self.button_names and
-                              event.state in self.button_names[event.code]):
-                            direction = self.button_names[event.code][event.state]
-                            self.window.after(
-                                0,
-                                lambda d=direction, s=True, t=current_time:
-                                self.handle_input(d, s, t)
-                            )
-                            
+                    enqueue_input(event.code, event.state, current_time)
+            except (InterruptedError, BlockingIOError):
+                # Transient; the controller is still there, so read again
+                continue
             except Exception as e:
-                self.window.after(
-                    0,
-                    lambda: self.current_input_label.config(
-                        text=f"Controller error: {str(e)}"
-                    )
-                )
+                # Never touch Tk from this thread; let the drain report it,
+                # once per failure rather than on every retry
+                if not errored:
+                    self._events.append((self.KIND_ERROR, str(e)))
+                    errored = True
+                    retry_delay = 0.1
+                else:
+                    # Back off during a long disconnect, up to one second
+                    retry_delay = min(retry_delay * 2, 1.0)
+                
+                # Don't spin while the controller is disconnected
+                self._wake.wait(retry_delay)
+
+    def _drain(self):
+        """Process all queued controller events on the GUI thread."""
+        start = perf_counter()
+        try:
+            events = self._events
+            popleft = events.popleft
+            kind_handlers = self._kind_handlers
+            while events:
+                item = popleft()
+                kind_handlers[item[0]](item)
+            
+            # Render at most one update per stick, skipping unchanged ones
+            for stick, position in self._pending_stick.items():
+                if position is not None:
+                    self._pending_stick[stick] = None
+                    if position != self._last_stick_state[stick]:
+                        self._last_stick_state[stick] = position
+                        self.update_analog_display(stick, *position)
+            
+            if self._debug_dirty:
+                self.render_debug_info()
+            
+            self.update_counter()
+            
+            if self._hist_buf and self._history_visible:
+                self.flush_history()
+        finally:
+            # Always reschedule, so one bad event can't stop the GUI updating
+            # and this drain's own cost doesn't stretch the cadence
+            elapsed_ms = int((perf_counter() - start) * 1000)
+            delay = max(1, self.drain_interval - elapsed_ms)
+            self.window.after(delay, self._drain)
+
+    def _on_map(self, event):
+        """Resume history writes once the main window is shown again."""
+        # The root's bindings also see events from every child widget
+        if event.widget is self.window:
+            self._history_visible = True
+
+    def _on_unmap(self, event):
+        """Pause history writes while the main window is minimized."""
+        if event.widget is self.window:
+            self._history_visible = False
+
+    def _show_error(self, queued_error):
+        """Display a queued KIND_ERROR message from the reader thread."""
+        self._set_text(
+            self.current_input_var,
+            f"Controller error: {queued_error[1]}"
+        )
+
+    def _dispatch(self, queued_event):
+        """Route a single queued KIND_INPUT event to its handler."""
+        _, code, state, current_time = queued_event
+        
+        # Update debug information
+        self.update_debug_info(code, state)
+        
+        handler = self._handlers.get(code)
+        if handler:
+            handler(code, state, current_time)
+
+    def _handle_button(self, code, state, timestamp):
+        """Handle a regular button event."""
+        self.handle_input(self.button_names[code], bool(state), timestamp)
+
+    def _handle_analog(self, code, state, timestamp):
+        """Handle an analog stick axis event."""
+        slot = self.analog_mapping[code]
+        states = self.analog_states
+        states[slot] = state
+        
+        # Queue analog display update for the end of the drain
+        base = slot & ~1
+        x = states[base]
+        y = states[base + 1]
+        stick = self.STICK_NAMES[slot >> 1]
+        if abs(x) > self.analog_threshold or abs(y) > self.analog_threshold:
+            self._pending_stick[stick] = (x, y)
+        else:
+            # Back near center: drop any stale excursion and show the stick
+            # centered, so the next movement is compared against center
+            self._pending_stick[stick] = (0, 0)
+            self._stick_directions[stick] = 'Center'
+
+    def _handle_trigger(self, code, state, timestamp):
+        """Handle an R2/L2 trigger event."""
+        button_name = self.trigger_names[code]
+        current_state = self.button_states.get(button_name, False)
+        
+        # Press above the upper threshold, release below the lower one
+        if current_state:
+            is_pressed = state >= self.trigger_release_threshold
+        else:
+            is_pressed = state > self.trigger_press_threshold
+        
+        # Only register state change if crosses threshold
+        if current_state != is_pressed:
+            self.button_states[button_name] = is_pressed
+            self.handle_input(button_name, is_pressed, timestamp)
+
+    def _handle_dpad(self, code, state, timestamp):
+        """Handle a D-pad event."""
+        direction = self._dpad_lookup.get((code, state))
+        if direction:
+            self.handle_input(direction, True, timestamp)
 
     def handle_input(self, input_name, is_pressed, timestamp):
         """Process and display a controller input event."""
         # Update current input display
         state_str = "pressed" if is_pressed else "released"
-        self.current_input_label.config(
-            text=f"Current Input: {input_name} ({state_str})"
+        self._set_text(
+            self.current_input_var,
+            f"Current Input: {input_name} ({state_str})"
         )
         
         # Add to history
         self.add_to_history(input_name, is_pressed, timestamp)
         
-        # Update counter only on press
+        # Count presses; the labels are refreshed on the next drain
         if is_pressed:
-            self.update_counter()
+            self.press_count += 1
 
     def run(self):
         """Start the application main loop."""
@@ -369,6 +752,7 @@ class ControllerCounter:
             self.window.mainloop()
         finally:
             self.running = False
+            self._wake.set()
 
 
 if __name__ == "__main__":